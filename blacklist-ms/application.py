@@ -5,8 +5,10 @@ from flask import Flask, jsonify, request
 from sqlalchemy import inspect
 from sqlalchemy.pool import StaticPool
 
+from src import config
 from src.config import DATABASE_URL as CFG_DATABASE_URL, PORT
 from src.models import db, Blacklist  # importa el modelo para registrar metadata
+from src.cache import cache
 
 # ---- Feature flag ----
 FEATURE_VERBOSE = os.getenv("FEATURE_VERBOSE", "false").lower() == "true"
@@ -40,6 +42,15 @@ if engine_opts:
 # ---- Inicializa SQLAlchemy ----
 db.init_app(app)
 
+# ---- Caché de GET compartida entre workers (mmap + generación) ----
+app.config["BLACKLIST_CACHE_ENABLED"] = config.BLACKLIST_CACHE_ENABLED
+app.config["BLACKLIST_CACHE_PATH"] = config.BLACKLIST_CACHE_PATH
+app.config["BLACKLIST_CACHE_SLOTS"] = config.BLACKLIST_CACHE_SLOTS
+app.config["BLACKLIST_CACHE_SLOT_SIZE"] = config.BLACKLIST_CACHE_SLOT_SIZE
+app.config["BLACKLIST_CACHE_TTL"] = config.BLACKLIST_CACHE_TTL
+app.config["BLACKLIST_CACHE_NEGATIVE_TTL"] = config.BLACKLIST_CACHE_NEGATIVE_TTL
+cache.init_app(app)
+
 
 def _ensure_schema():
     """Crea tablas si aún no existen en el engine ACTIVO."""
@@ -0,0 +1,315 @@
+# blacklist-ms/src/cache.py
+"""
+Caché de consultas de `GET /blacklists/<email>` compartida entre los workers
+de gunicorn de un mismo contenedor.
+
+- Vive en un archivo mapeado en memoria (mmap, por defecto en /dev/shm), así
+  que el consumo es fijo (slots * slot_size) sin importar cuántos workers haya.
+- Tabla de acceso directo: cada email cae en un único slot (hash estable);
+  una colisión simplemente sobrescribe la entrada anterior.
+- Invalidación por generación global: cada entrada guarda la generación con
+  la que se llenó y solo es válida mientras coincida con la del encabezado.
+  `invalidate()` (llamado por `add_blacklist`) la incrementa, de modo que
+  los workers ven la escritura en su siguiente lookup. OJO: solo alcanza a
+  los workers del MISMO contenedor; las demás instancias (Elastic Beanstalk)
+  y las escrituras que no pasan por `add_blacklist` dependen del TTL
+  (`BLACKLIST_CACHE_TTL`, y `BLACKLIST_CACHE_NEGATIVE_TTL` para los 404).
+- Los misses concurrentes del mismo email se agrupan: quien consulta la BD
+  marca el slot como "cargando" esa clave y los demás esperan (como mucho
+  `_LOAD_WAIT` segundos) a que aparezca la entrada. Si el slot está cargando
+  OTRA clave (colisión) se va directo a la BD sin cachear. El lock del slot
+  solo se toma para leer/escribir la entrada, nunca durante la consulta.
+  Si la respuesta no entra en el slot se deja una marca de "no cacheable" y
+  los pedidos siguientes van a la BD en paralelo, sin esperar turno.
+- Los tiempos (TTL, marcas huérfanas) usan `time.monotonic()`, que en Linux
+  es del sistema y se compara bien entre procesos; no le afectan los
+  ajustes de NTP.
+"""
+import hashlib
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - p.ej. Windows: caché deshabilitada
+    fcntl = None
+
+_MAGIC = b"BLCACHE2"
+# magic, slots, slot_size, generation
+_HEADER = struct.Struct("<8sIIQ")
+_HEADER_SIZE = 64
+# generation, key_hash, filled_at, loading_hash, loading_since, status, payload_len
+_SLOT_HEADER = struct.Struct("<QQdQdHH")
+_SLOT_GEN = struct.Struct("<Q")
+# Offset de la generación dentro del encabezado (alineado a 8 bytes)
+_HEADER_GEN_OFFSET = 16
+# payload_len reservado: la respuesta no entra en el slot
+_OVERSIZE = 0xFFFF
+# Resultado de `_read` para una entrada "no cacheable" vigente
+_BYPASS = object()
+_THREAD_STRIPES = 64
+# Espera máxima por la carga de otro worker (y edad a partir de la cual una
+# marca de "cargando" se considera huérfana, p.ej. worker matado por timeout)
+_LOAD_WAIT = 2.0
+_POLL_INTERVAL = 0.01
+
+
+def _key_hash(key: str) -> int:
+    """Hash estable entre procesos (hash() de Python es aleatorio por proceso)."""
+    digest = hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest()
+    # 0 se reserva para "sin clave" en la marca de carga
+    return int.from_bytes(digest, "little") or 1
+
+
+class SharedLookupCache:
+    """Igual que `db`: instancia a nivel de módulo + `init_app(app)`."""
+
+    def __init__(self, app=None, clock=time.monotonic):
+        self._clock = clock
+        self._mm = None
+        self._fd = None
+        self._slots = 0
+        self._slot_size = 0
+        self._ttl = 0.0
+        self._negative_ttl = 0.0
+        self._header_lock = threading.Lock()
+        self._thread_locks = [threading.Lock() for _ in range(_THREAD_STRIPES)]
+        if app is not None:
+            self.init_app(app)
+
+    @property
+    def enabled(self) -> bool:
+        return self._mm is not None
+
+    def init_app(self, app):
+        app.extensions["blacklist_cache"] = self
+        if fcntl is None or not app.config.get("BLACKLIST_CACHE_ENABLED", True):
+            self.close()
+            return
+        try:
+            self._ttl = float(app.config["BLACKLIST_CACHE_TTL"])
+            self._negative_ttl = float(app.config["BLACKLIST_CACHE_NEGATIVE_TTL"])
+            self._attach(
+                app.config["BLACKLIST_CACHE_PATH"],
+                int(app.config["BLACKLIST_CACHE_SLOTS"]),
+                int(app.config["BLACKLIST_CACHE_SLOT_SIZE"]),
+            )
+        except (KeyError, OSError, ValueError):
+            # Sin caché se sigue sirviendo desde la BD
+            self.close()
+
+    def _open_locked(self, path: str) -> int:
+        """Abre `path` con el lock del encabezado tomado, asegurando que el fd
+        sigue siendo el archivo publicado (otro worker pudo reemplazarlo)."""
+        while True:
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+            self._lock(fd, 0)
+            try:
+                st, current = os.fstat(fd), os.stat(path)
+                if (st.st_dev, st.st_ino) == (current.st_dev, current.st_ino):
+                    return fd
+            except FileNotFoundError:
+                pass
+            self._unlock(fd, 0)
+            os.close(fd)
+
+    @staticmethod
+    def _publish_new(path: str, slots: int, slot_size: int, size: int) -> int:
+        """Arma un archivo en ceros al lado de `path` y lo publica con os.replace."""
+        tmp = "{}.{}.tmp".format(path, os.getpid())
+        fd = os.open(tmp, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o600)
+        try:
+            os.ftruncate(fd, size)
+            os.pwrite(fd, _HEADER.pack(_MAGIC, slots, slot_size, 1), 0)
+            os.replace(tmp, path)
+        except Exception:
+            os.close(fd)
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+        return fd
+
+    def _attach(self, path: str, slots: int, slot_size: int):
+        if slots <= 0 or slot_size <= _SLOT_HEADER.size:
+            raise ValueError("invalid cache layout")
+        self.close()
+        size = _HEADER_SIZE + slots * slot_size
+        fd = self._open_locked(path)
+        try:
+            new_fd = None
+            try:
+                current = os.fstat(fd).st_size
+                header = os.pread(fd, _HEADER.size, 0) if current >= _HEADER.size else b""
+                if (
+                    current != size
+                    or len(header) != _HEADER.size
+                    or _HEADER.unpack(header)[:3] != (_MAGIC, slots, slot_size)
+                ):
+                    # Archivo nuevo o con otro layout: NO se trunca (otros
+                    # workers pueden tenerlo mapeado → SIGBUS), se reemplaza.
+                    new_fd = self._publish_new(path, slots, slot_size, size)
+                else:
+                    # Un worker que arranca no sabe si la BD cambió mientras
+                    # el archivo quedó huérfano: se descarta lo que haya.
+                    gen = _HEADER.unpack(header)[3]
+                    os.pwrite(fd, _HEADER.pack(_MAGIC, slots, slot_size, gen + 1), 0)
+            finally:
+                self._unlock(fd, 0)
+            if new_fd is not None:
+                os.close(fd)
+                fd = new_fd
+            mm = mmap.mmap(fd, size, mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
+        except Exception:
+            os.close(fd)
+            raise
+        self._fd, self._mm = fd, mm
+        self._slots, self._slot_size = slots, slot_size
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    # ---- Locks (rango de 1 byte por slot; byte 0 = encabezado) ----
+    @staticmethod
+    def _lock(fd, offset):
+        fcntl.lockf(fd, fcntl.LOCK_EX, 1, offset, os.SEEK_SET)
+
+    @staticmethod
+    def _unlock(fd, offset):
+        fcntl.lockf(fd, fcntl.LOCK_UN, 1, offset, os.SEEK_SET)
+
+    @contextmanager
+    def _slot_lock(self, index):
+        """Lock corto del slot (hilos + procesos); entrega el offset del slot."""
+        offset = _HEADER_SIZE + index * self._slot_size
+        with self._thread_locks[index % _THREAD_STRIPES]:
+            self._lock(self._fd, offset)
+            try:
+                yield offset
+            finally:
+                self._unlock(self._fd, offset)
+
+    def _generation(self) -> int:
+        # Lectura alineada de 8 bytes sin lock: solo `invalidate` la escribe
+        return _SLOT_GEN.unpack_from(self._mm, _HEADER_GEN_OFFSET)[0]
+
+    def invalidate(self):
+        """Incrementa la generación global: invalida todas las entradas."""
+        if not self.enabled:
+            return
+        with self._header_lock:
+            self._lock(self._fd, 0)
+            try:
+                magic, slots, slot_size, gen = _HEADER.unpack_from(self._mm, 0)
+                _HEADER.pack_into(self._mm, 0, magic, slots, slot_size, gen + 1)
+            finally:
+                self._unlock(self._fd, 0)
+
+    # ---- Lookup (siempre con el lock del slot tomado) ----
+    def _read(self, offset, key, key_hash, gen, now):
+        entry_gen, entry_hash, filled_at, _, _, status, length = _SLOT_HEADER.unpack_from(self._mm, offset)
+        if entry_gen != gen or entry_hash != key_hash:
+            return None
+        ttl = self._negative_ttl if status >= 400 else self._ttl
+        if not (0 <= now - filled_at < ttl):
+            return None
+        if length == _OVERSIZE:
+            return _BYPASS
+        if length > self._slot_size - _SLOT_HEADER.size:
+            return None
+        start = offset + _SLOT_HEADER.size
+        try:
+            body = json.loads(self._mm[start:start + length].decode("utf-8"))
+        except ValueError:
+            # Slot corrupto (p.ej. worker muerto a mitad de escritura): miss
+            return None
+        # El body ya trae el email: sirve para descartar colisiones de hash
+        if not isinstance(body, dict) or body.get("email") != key:
+            return None
+        return body, status
+
+    def _set_loading(self, offset, loading_hash, since):
+        fields = list(_SLOT_HEADER.unpack_from(self._mm, offset))
+        fields[3], fields[4] = loading_hash, since
+        _SLOT_HEADER.pack_into(self._mm, offset, *fields)
+
+    def _write(self, offset, key_hash, gen, body, status, now):
+        data = json.dumps(body, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        # Generación a 0 primero: si el worker muere a mitad de escritura el
+        # slot queda inválido en vez de un encabezado viejo sobre bytes mezclados.
+        _SLOT_GEN.pack_into(self._mm, offset, 0)
+        if _SLOT_HEADER.size + len(data) > self._slot_size:
+            # No cabe: marca "no cacheable" para que los demás no hagan cola
+            _SLOT_HEADER.pack_into(self._mm, offset, gen, key_hash, now, 0, 0.0, status, _OVERSIZE)
+            return
+        start = offset + _SLOT_HEADER.size
+        self._mm[start:start + len(data)] = data
+        _SLOT_HEADER.pack_into(self._mm, offset, gen, key_hash, now, 0, 0.0, status, len(data))
+
+    def get_or_load(self, key: str, loader):
+        """
+        Devuelve `(body, status)` para el email `key`. En miss llama
+        `loader()`, que debe devolver `(body, status)` con `body` un dict
+        serializable a JSON cuyo campo "email" sea `key`; los pedidos
+        concurrentes del mismo email esperan a esa única carga.
+        """
+        if not self.enabled:
+            return loader()
+
+        key_hash = _key_hash(key)
+        index = key_hash % self._slots
+        deadline = self._clock() + _LOAD_WAIT
+
+        claimed = False
+        while True:
+            with self._slot_lock(index) as offset:
+                now = self._clock()
+                # La generación se lee ANTES de ir a la BD: si un POST la
+                # incrementa mientras tanto, la entrada nace ya invalidada.
+                gen = self._generation()
+                hit = self._read(offset, key, key_hash, gen, now)
+                if hit is _BYPASS:
+                    break
+                if hit is not None:
+                    return hit
+                _, _, _, loading_hash, loading_since, _, _ = _SLOT_HEADER.unpack_from(self._mm, offset)
+                if loading_hash == 0 or not (0 <= now - loading_since < _LOAD_WAIT):
+                    self._set_loading(offset, key_hash, now)
+                    claimed = True
+                    break
+                other_key_loading = loading_hash != key_hash
+            if other_key_loading or self._clock() >= deadline:
+                # Colisión con otra clave o carga ajena demasiado lenta
+                break
+            time.sleep(_POLL_INTERVAL)
+        if not claimed:
+            # No cacheable, colisión o espera agotada: directo a la BD
+            return loader()
+        return self._load(index, key_hash, gen, loader)
+
+    def _load(self, index, key_hash, gen, loader):
+        """Consulta la BD con la marca de carga del slot tomada y publica el resultado."""
+        try:
+            body, status = loader()
+        except Exception:
+            with self._slot_lock(index) as offset:
+                if _SLOT_HEADER.unpack_from(self._mm, offset)[3] == key_hash:
+                    self._set_loading(offset, 0, 0.0)
+            raise
+        with self._slot_lock(index) as offset:
+            # Si otro worker dio la marca por huérfana y la pisó, no se escribe
+            if _SLOT_HEADER.unpack_from(self._mm, offset)[3] == key_hash:
+                self._write(offset, key_hash, gen, body, status, self._clock())
+        return body, status
+
+
+cache = SharedLookupCache()
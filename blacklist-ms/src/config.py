@@ -1,4 +1,19 @@
 import os
+import tempfile
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///local.db")
 AUTH_TOKEN = os.getenv("AUTH_TOKEN", "change-me-very-strong")
 PORT = int(os.getenv("PORT", "5000"))
+
+# ---- Caché compartida entre workers (src/cache.py) ----
+_SHM_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+BLACKLIST_CACHE_ENABLED = os.getenv("BLACKLIST_CACHE_ENABLED", "true").lower() == "true"
+BLACKLIST_CACHE_PATH = os.getenv("BLACKLIST_CACHE_PATH", os.path.join(_SHM_DIR, "blacklist-ms.cache"))
+BLACKLIST_CACHE_SLOTS = int(os.getenv("BLACKLIST_CACHE_SLOTS", "4096"))
+# Encabezado (44 B) + JSON de la fila más grande que admite el modelo:
+# email 320 + blocked_reason 255 caracteres a 2 bytes UTF-8 (tildes, ñ)
+# + app_uuid y claves ≈ 1.3 KiB. Lo que no entre se sirve sin cachear.
+BLACKLIST_CACHE_SLOT_SIZE = int(os.getenv("BLACKLIST_CACHE_SLOT_SIZE", "2048"))
+# Segundos de vida de una entrada: la invalidación por generación no cruza
+# instancias, así que el TTL acota cuánto tarda en verse una escritura ajena.
+BLACKLIST_CACHE_TTL = float(os.getenv("BLACKLIST_CACHE_TTL", "30"))
+BLACKLIST_CACHE_NEGATIVE_TTL = float(os.getenv("BLACKLIST_CACHE_NEGATIVE_TTL", "5"))
@@ -2,6 +2,7 @@
 from flask import Blueprint, jsonify
 from ..auth import require_bearer
 from ..models import Blacklist
+from ..cache import cache
 
 bp = Blueprint("blacklist_get", __name__)
 
@@ -13,6 +14,12 @@ def get_blacklist(email: str):
       - 200 si existe: {'email','app_uuid','blacklisted':True,['blocked_reason']}
       - 404 si no existe: {'error':'not found','email','blacklisted':False}
     """
+    payload, status = cache.get_or_load(email, lambda: _lookup(email))
+    return jsonify(payload), status
+
+
+def _lookup(email: str):
+    """Consulta la BD y arma `(payload, status)`; el resultado se cachea."""
     q = Blacklist.query.filter_by(email=email)
     try:
         row = q.order_by(Blacklist.created_at.desc()).first()
@@ -20,11 +27,11 @@ def get_blacklist(email: str):
         row = q.first()
 
     if row is None:
-        return jsonify({
+        return {
             "error": "not found",
             "email": email,
             "blacklisted": False
-        }), 404
+        }, 404
 
     payload = {
         "email": row.email,
@@ -35,4 +42,4 @@ def get_blacklist(email: str):
     if getattr(row, "blocked_reason", None):
         payload["blocked_reason"] = row.blocked_reason
 
-    return jsonify(payload), 200
\ No newline at end of file
+    return payload, 200
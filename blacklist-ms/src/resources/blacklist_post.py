@@ -3,6 +3,7 @@ from datetime import datetime
 import uuid
 from ..models import db, Blacklist
 from ..auth import require_bearer
+from ..cache import cache
 
 bp = Blueprint("blacklist_post", __name__)
 
@@ -42,4 +43,6 @@ def add_blacklist():
         bl.created_at = datetime.utcnow()
 
     db.session.commit()
+    # Después del commit: todos los workers releen la BD en su próximo GET
+    cache.invalidate()
     return jsonify({"message": "blacklist updated", "email": email}), 201
@@ -0,0 +1,5 @@
+import os
+
+# La caché compartida vive en /dev/shm y sobrevive entre corridas: en los
+# tests se deshabilita; test_cache.py la activa con un archivo en tmp_path.
+os.environ["BLACKLIST_CACHE_ENABLED"] = "false"